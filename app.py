@@ -5,21 +5,21 @@ With Supabase database integration for persistent storage
 """
 
 import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
-from pathlib import Path
 import re
-from datetime import datetime, date, timedelta
-from io import StringIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from io import BytesIO
 
 # Import our modules
 from extractors import extract_sales_data, extract_invoice_data
-from config import VENDOR_CONFIG, DISH_INGREDIENT_MAP
+from config import DISH_PATTERN_RE
 from database import (
     init_supabase, save_invoices, save_sales, 
     load_invoices, load_sales, get_date_range, get_data_summary,
-    delete_data_by_date_range
+    get_overview_metrics, delete_data_by_date_range
 )
 
 st.set_page_config(
@@ -28,6 +28,248 @@ st.set_page_config(
     layout="wide"
 )
 
+# Precompiled ingredient-match patterns (pandas accepts compiled patterns,
+# so each .str.contains call skips the per-call regex compile); the dish
+# matchers come pre-frozen from the config
+_BEEF_SALES_RE = DISH_PATTERN_RE['Beef Tenderloin']
+_CAVIAR_SALES_RE = DISH_PATTERN_RE['Egg Toast Caviar']
+_BEEF_INV_RE = re.compile('ヒレ|フィレ|tenderloin|牛', re.IGNORECASE)
+_CAVIAR_INV_RE = re.compile('キャビア|KAVIARI|caviar', re.IGNORECASE)
+
+# Column order emitted by the invoice extractors
+INVOICE_COLUMNS = ['vendor', 'date', 'item_name', 'quantity', 'unit', 'unit_price', 'amount']
+
+# Fixed fallback prices for course items whose POS price is recorded as 0
+BEEF_DINNER_PRICE = 5682
+CAVIAR_COURSE_PRICE = 19480.44  # 6-course dinner menu
+CAVIAR_NUM_COURSES = 6
+CAVIAR_COURSE_ITEM_PRICE = CAVIAR_COURSE_PRICE / CAVIAR_NUM_COURSES
+
+
+def _format_yen(series: pd.Series) -> pd.Series:
+    """Format a numeric column as yen in one pass (no per-row lambda)"""
+    return ('¥' + series.map('{:,.0f}'.format, na_action='ignore')).fillna('')
+
+
+@st.cache_data(show_spinner=False)
+def _category_summary(sales: pd.DataFrame, fallback_price: float) -> pd.DataFrame:
+    """
+    Per-category qty/revenue rollup using the same price fill-in as the
+    metric cards; cached per (slice, price) so tab revisits reuse it
+    """
+    _, revenue = _fill_price_and_revenue(sales, fallback_price)
+
+    # Sum per category with bincount over the categorical codes: one
+    # C pass per column instead of the pandas hash-group machinery
+    cat = pd.Categorical(sales['category'])
+    codes = cat.codes.astype(np.intp)
+    qty = sales['qty'].to_numpy(dtype=np.float64)
+    rev = revenue.to_numpy(dtype=np.float64)
+
+    valid = codes >= 0  # a missing category encodes as -1
+    if not valid.all():
+        codes, qty, rev = codes[valid], qty[valid], rev[valid]
+
+    n_cats = len(cat.categories)
+    summary = pd.DataFrame({
+        'Category/カテゴリ': cat.categories,
+        'Qty/数量': np.bincount(codes, weights=qty, minlength=n_cats),
+        'Revenue/売上': np.bincount(codes, weights=rev, minlength=n_cats),
+    })
+    # Keep only categories that occur in this slice (observed behaviour)
+    occurs = np.bincount(codes, minlength=n_cats) > 0
+    return summary[occurs].reset_index(drop=True)
+
+
+# Money columns shown in the interactive tables; formatted client-side
+# so the values stay numeric (and sortable) end to end
+CURRENCY_COLS = ('Amount/金額', 'Price/単価', 'Revenue/売上', 'Unit Price/単価')
+
+
+def _currency_config(df: pd.DataFrame) -> dict:
+    """column_config formatting the money columns as yen in the frontend"""
+    return {col: st.column_config.NumberColumn(format='yen') for col in CURRENCY_COLS if col in df.columns}
+
+
+def _fill_price_and_revenue(sales: pd.DataFrame, fallback_price: float) -> tuple:
+    """
+    Vectorized price/revenue fill-in shared by the analysis tabs:
+    use the fixed course price where price is 0 or missing, then take
+    net_total as revenue, falling back to qty * price where it is 0
+    """
+    price = sales['price'].where((sales['price'] != 0) & sales['price'].notna(), fallback_price)
+    revenue = sales['net_total'].where(sales['net_total'] != 0, sales['qty'] * price)
+    return price, revenue
+
+
+@st.cache_resource(show_spinner=False)
+def _get_supabase():
+    """Build the Supabase client once per session instead of per rerun"""
+    return init_supabase()
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_load_invoices(start_date, end_date) -> pd.DataFrame:
+    """Cache invoice loads per date range so tab switches and widget
+    tweaks don't re-query Supabase"""
+    return load_invoices(_get_supabase(), start_date, end_date)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_load_sales(start_date, end_date) -> pd.DataFrame:
+    """Cache sales loads per date range (see _cached_load_invoices)"""
+    return load_sales(_get_supabase(), start_date, end_date)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_data_summary() -> dict:
+    """Cache the sidebar summary counts briefly between reruns"""
+    return get_data_summary(_get_supabase())
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_date_range() -> tuple:
+    """Cache the available min/max dates briefly between reruns"""
+    return get_date_range(_get_supabase())
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_overview_metrics(start_date, end_date) -> dict:
+    """Cache the server-side overview aggregates per date range"""
+    return get_overview_metrics(_get_supabase(), start_date, end_date)
+
+
+def _clear_db_caches():
+    """Drop cached query results after a write or delete"""
+    _cached_load_invoices.clear()
+    _cached_load_sales.clear()
+    _cached_data_summary.clear()
+    _cached_date_range.clear()
+    _cached_overview_metrics.clear()
+
+
+@st.cache_data(show_spinner=False)
+def _cached_extract_sales(file_bytes: bytes, name: str) -> pd.DataFrame:
+    """Run sales CSV extraction once per unique file content"""
+    buf = BytesIO(file_bytes)
+    buf.name = name
+    return extract_sales_data(buf)
+
+
+@st.cache_data(show_spinner=False)
+def _cached_extract_invoice(file_bytes: bytes, name: str) -> list:
+    """Run invoice PDF/Excel extraction (incl. OCR) once per unique file content"""
+    buf = BytesIO(file_bytes)
+    buf.name = name
+    return extract_invoice_data(buf)
+
+
+def _safe_extract_sales(uploaded_file):
+    """Thread-pool worker: extract one sales CSV, capturing any error"""
+    try:
+        return uploaded_file.name, _cached_extract_sales(uploaded_file.getvalue(), uploaded_file.name), None
+    except Exception as e:
+        return uploaded_file.name, None, e
+
+
+def _safe_extract_invoice(uploaded_file):
+    """Thread-pool worker: extract one invoice PDF/Excel, capturing any error"""
+    try:
+        return uploaded_file.name, _cached_extract_invoice(uploaded_file.getvalue(), uploaded_file.name), None
+    except Exception as e:
+        return uploaded_file.name, None, e
+
+
+@st.cache_data(show_spinner=False)
+def _make_comparison_fig(purchased: float, expected: float, unit_label: str):
+    """
+    Build the purchased/expected/waste bar chart once per unique inputs.
+    Uses graph_objects directly: plotly express spends most of its time
+    converting the input frame into the same traces.
+    """
+    fig = go.Figure(go.Bar(
+        x=['Purchased\n仕入量', 'Expected Usage\n予想使用量', 'Potential Waste\n予想ロス'],
+        y=[purchased, expected, max(0, purchased - expected)],
+        marker_color=['#3366cc', '#109618', '#dc3912']
+    ))
+    fig.update_layout(showlegend=False, yaxis_title=f'Amount ({unit_label})')
+    return fig
+
+
+@st.cache_data(show_spinner=False)
+def _build_views(sales_df: pd.DataFrame, invoices_df: pd.DataFrame) -> dict:
+    """
+    Compute the per-ingredient filtered views once per unique dataset
+    so the display functions don't each re-scan the full frames
+    """
+    empty = pd.DataFrame()
+    views = {'sales': sales_df, 'invoices': invoices_df}
+
+    if not sales_df.empty:
+        # Compute each boolean mask once; the mask is reused for both the
+        # slice here and the metric sums downstream
+        beef_mask = sales_df['name'].str.contains(_BEEF_SALES_RE, na=False)
+        caviar_mask = sales_df['name'].str.contains(_CAVIAR_SALES_RE, na=False)
+        views['beef_sales'] = sales_df[beef_mask]
+        views['caviar_sales'] = sales_df[caviar_mask]
+        views['beef_sales_mask'] = beef_mask
+        views['caviar_sales_mask'] = caviar_mask
+    else:
+        views['beef_sales'] = empty
+        views['caviar_sales'] = empty
+        views['beef_sales_mask'] = pd.Series(dtype=bool)
+        views['caviar_sales_mask'] = pd.Series(dtype=bool)
+
+    if not invoices_df.empty:
+        views['beef_invoices'] = invoices_df[invoices_df['item_name'].str.contains(_BEEF_INV_RE, na=False)]
+        views['caviar_invoices'] = invoices_df[invoices_df['item_name'].str.contains(_CAVIAR_INV_RE, na=False)]
+    else:
+        views['beef_invoices'] = empty
+        views['caviar_invoices'] = empty
+
+    return views
+
+
+@st.cache_data(show_spinner=False)
+def _compute_ingredient_stats(views: dict) -> dict:
+    """
+    Fuse the per-ingredient reductions (dishes sold, revenue, purchased
+    quantity, cost) into one pass each so the tabs read precomputed
+    scalars instead of re-scanning the frames
+    """
+    stats = {}
+
+    for key, fallback_price in (('beef', BEEF_DINNER_PRICE), ('caviar', CAVIAR_COURSE_ITEM_PRICE)):
+        sales = views[f'{key}_sales']
+        invoices = views[f'{key}_invoices']
+
+        if not sales.empty:
+            _, revenue = _fill_price_and_revenue(sales, fallback_price)
+            # Single fused reduction over both columns
+            totals = pd.concat({'qty': sales['qty'], 'revenue': revenue}, axis=1).agg('sum')
+            qty_total = float(totals['qty'])
+            revenue_total = float(totals['revenue'])
+        else:
+            qty_total = 0.0
+            revenue_total = 0.0
+
+        if not invoices.empty:
+            inv_totals = invoices.agg({'quantity': 'sum', 'amount': 'sum'})
+            purchased = float(inv_totals['quantity'])
+            cost = float(inv_totals['amount'])
+        else:
+            purchased = 0.0
+            cost = 0.0
+
+        stats[key] = {
+            'qty': qty_total,
+            'revenue': revenue_total,
+            'purchased': purchased,
+            'cost': cost,
+        }
+
+    return stats
+
 # Custom CSS for bilingual support
 st.markdown("""
 <style>
@@ -72,15 +314,15 @@ def main():
     if 'upload_key' not in st.session_state:
         st.session_state.upload_key = 0
     
-    # Initialize Supabase
-    supabase = init_supabase()
+    # Initialize Supabase (cached client, reused across reruns)
+    supabase = _get_supabase()
     
     # Sidebar
     with st.sidebar:
         # Database status
         st.header("💾 Database / データベース")
         if supabase:
-            summary = get_data_summary(supabase)
+            summary = _cached_data_summary()
             st.markdown('<div class="db-status-connected">✅ Connected / 接続中</div>', unsafe_allow_html=True)
             st.caption(f"📊 {summary.get('invoice_count', 0)} invoices, {summary.get('sales_count', 0)} sales records")
             if summary.get('min_date') and summary.get('max_date'):
@@ -99,7 +341,7 @@ def main():
         
         # Get available date range from database
         if supabase:
-            db_min_date, db_max_date = get_date_range(supabase)
+            db_min_date, db_max_date = _cached_date_range()
         else:
             db_min_date, db_max_date = None, None
         
@@ -217,37 +459,43 @@ def main():
                     
                     total_files = len(invoice_files) + len(sales_files)
                     processed = 0
-                    
-                    # Process invoices
-                    for inv in invoice_files:
-                        progress_text.text(f"Processing invoice: {inv.name}...")
-                        try:
-                            invoice_data = extract_invoice_data(inv)
-                            if invoice_data:
-                                saved_invoices += save_invoices(supabase, invoice_data)
-                        except Exception as e:
-                            st.warning(f"Error processing {inv.name}: {e}")
-                        processed += 1
-                        progress_bar.progress(processed / total_files)
-                    
-                    # Process sales
-                    for sf in sales_files:
-                        progress_text.text(f"Processing sales: {sf.name}...")
-                        try:
-                            sales_df = extract_sales_data(sf)
-                            if sales_df is not None and not sales_df.empty:
-                                saved_sales += save_sales(supabase, sales_df)
-                        except Exception as e:
-                            st.warning(f"Error processing {sf.name}: {e}")
-                        processed += 1
-                        progress_bar.progress(processed / total_files)
-                    
+
+                    # Extract files in parallel (PDF parsing / OCR release
+                    # the GIL in their C libraries); collect everything and
+                    # save once per batch so N files cost one insert batch,
+                    # not N round-trip groups
+                    invoice_rows = []
+                    sales_frames = []
+                    with ThreadPoolExecutor(max_workers=min(8, total_files)) as ex:
+                        futures = {ex.submit(_safe_extract_invoice, inv): 'invoice' for inv in invoice_files}
+                        futures.update({ex.submit(_safe_extract_sales, sf): 'sales' for sf in sales_files})
+
+                        for future in as_completed(futures):
+                            kind = futures[future]
+                            name, result, error = future.result()
+                            progress_text.text(f"Processing: {name}...")
+                            if error is not None:
+                                st.warning(f"Error processing {name}: {error}")
+                            elif kind == 'invoice' and result:
+                                invoice_rows.extend(result)
+                            elif kind == 'sales' and result is not None and not result.empty:
+                                sales_frames.append(result)
+                            processed += 1
+                            progress_bar.progress(processed / total_files)
+
+                    progress_text.text("Saving to database...")
+                    if invoice_rows:
+                        saved_invoices = save_invoices(supabase, invoice_rows)
+                    if sales_frames:
+                        saved_sales = save_sales(supabase, pd.concat(sales_frames, ignore_index=True, sort=False))
+
                     progress_bar.progress(100)
                     progress_text.empty()
                     st.success(f"✅ Saved {saved_invoices} invoices, {saved_sales} sales records")
                     
                     # Clear file uploaders by incrementing the key
                     st.session_state.upload_key += 1
+                    _clear_db_caches()
                     st.rerun()
         
         st.divider()
@@ -274,6 +522,7 @@ def main():
                 if supabase:
                     deleted = delete_data_by_date_range(supabase, start_date, end_date)
                     st.info(f"Deleted {deleted['invoices']} invoices, {deleted['sales']} sales")
+                    _clear_db_caches()
                     st.rerun()
     
     # Main content area - Load data from database or files
@@ -283,18 +532,18 @@ def main():
     # Check if database has ANY data (regardless of date filter)
     db_has_data = False
     if supabase:
-        summary = get_data_summary(supabase)
+        summary = _cached_data_summary()
         db_has_data = (summary.get('invoice_count', 0) > 0 or summary.get('sales_count', 0) > 0)
     
     if supabase and db_has_data:
         # Load from database with date filter (or no filter if debug checkbox is checked)
         if disable_date_filter:
-            invoices_df = load_invoices(supabase, None, None)
-            sales_df = load_sales(supabase, None, None)
+            invoices_df = _cached_load_invoices(None, None)
+            sales_df = _cached_load_sales(None, None)
             st.info("🔧 Debug mode: Loading ALL data without date filter")
         else:
-            invoices_df = load_invoices(supabase, start_date, end_date)
-            sales_df = load_sales(supabase, start_date, end_date)
+            invoices_df = _cached_load_invoices(start_date, end_date)
+            sales_df = _cached_load_sales(start_date, end_date)
         
         # DEBUG: Show what was actually queried
         st.sidebar.markdown("---")
@@ -306,8 +555,9 @@ def main():
         st.sidebar.write(f"Sales rows returned: {len(sales_df)}")
         if not sales_df.empty and 'date' in sales_df.columns:
             st.sidebar.write(f"Dates in result: {sorted(sales_df['date'].unique())}")
-            beef_df = sales_df[sales_df['name'].str.contains('Beef Tenderloin', case=False, na=False)]
-            st.sidebar.write(f"Beef rows: {len(beef_df)}, qty: {beef_df['qty'].sum():.0f}")
+            beef_mask = sales_df['name'].str.contains(_BEEF_SALES_RE, na=False).to_numpy()
+            beef_qty = sales_df['qty'].to_numpy()[beef_mask]
+            st.sidebar.write(f"Beef rows: {beef_mask.sum()}, qty: {beef_qty.sum():.0f}")
         
         # Show message if no data in selected period (but DB has data)
         if sales_df.empty and invoices_df.empty:
@@ -319,29 +569,35 @@ def main():
     elif sales_files or invoice_files:
         st.info("📤 Preview mode: Showing uploaded file data. Click 'Save to Database' to persist.")
         
-        # Process files for preview
+        # Process files for preview (parallel across uploads)
         all_sales = []
-        for sf in sales_files:
-            try:
-                sf.seek(0)  # Reset file pointer
-                temp_sales = extract_sales_data(sf)
-                if temp_sales is not None:
-                    all_sales.append(temp_sales)
-            except Exception as e:
-                st.warning(f"Error processing {sf.name}: {e}")
-        
         all_invoices = []
-        for inv in invoice_files:
-            try:
-                inv.seek(0)  # Reset file pointer
-                invoice_data = extract_invoice_data(inv)
-                if invoice_data:
-                    all_invoices.extend(invoice_data)
-            except Exception as e:
-                st.warning(f"Error processing {inv.name}: {e}")
-        
-        sales_df = pd.concat(all_sales, ignore_index=True) if all_sales else pd.DataFrame()
-        invoices_df = pd.DataFrame(all_invoices) if all_invoices else pd.DataFrame()
+        with ThreadPoolExecutor(max_workers=min(8, len(sales_files) + len(invoice_files))) as ex:
+            sales_results = list(ex.map(_safe_extract_sales, sales_files))
+            invoice_results = list(ex.map(_safe_extract_invoice, invoice_files))
+
+        for name, temp_sales, error in sales_results:
+            if error is not None:
+                st.warning(f"Error processing {name}: {error}")
+            elif temp_sales is not None:
+                all_sales.append(temp_sales)
+
+        for name, invoice_data, error in invoice_results:
+            if error is not None:
+                st.warning(f"Error processing {name}: {error}")
+            elif invoice_data:
+                all_invoices.extend(invoice_data)
+        
+        # Single concat without column sorting; the explicit column list
+        # lets pandas infer invoice dtypes once instead of per chunk.
+        # With one uploaded file (the common case) skip the concat copy.
+        if not all_sales:
+            sales_df = pd.DataFrame()
+        elif len(all_sales) == 1:
+            sales_df = all_sales[0]
+        else:
+            sales_df = pd.concat(all_sales, ignore_index=True, sort=False)
+        invoices_df = pd.DataFrame.from_records(all_invoices, columns=INVOICE_COLUMNS) if all_invoices else pd.DataFrame()
     
     else:
         # Show welcome message
@@ -393,15 +649,52 @@ def main():
             
             # Show Beef Tenderloin count specifically
             if not sales_df.empty:
-                beef = sales_df[sales_df['name'].str.contains('Beef Tenderloin', case=False, na=False)]
+                beef = sales_df[sales_df['name'].str.contains(_BEEF_SALES_RE, na=False)]
                 st.write(f"**Beef Tenderloin:** {len(beef)} rows, **{beef['qty'].sum():.0f} dishes total**")
                 
                 # Show by date
                 if 'date' in beef.columns:
-                    beef_by_date = beef.groupby('date')['qty'].sum().reset_index()
+                    beef_by_date = beef.groupby('date', sort=False, as_index=False, observed=True)['qty'].sum()
                     st.write("**Beef by date:**")
-                    st.dataframe(beef_by_date, use_container_width=True)
-    
+                    st.table(beef_by_date)
+    
+    # Downcast the money/quantity columns: the yen and kg magnitudes here
+    # fit float32 comfortably, and the repeated sums are memory-bound
+    if not sales_df.empty:
+        for c in ('qty', 'price', 'net_total', 'gross_total', 'discount'):
+            if c in sales_df.columns:
+                sales_df[c] = sales_df[c].astype('float32')
+    if not invoices_df.empty:
+        for c in ('quantity', 'unit_price', 'amount'):
+            if c in invoices_df.columns:
+                invoices_df[c] = invoices_df[c].astype('float32')
+
+    # Categorical dtype for low-cardinality columns: groupby/filter then
+    # work on integer codes instead of hashing strings per row
+    if not invoices_df.empty:
+        for c in ('vendor', 'item_name', 'unit'):
+            if c in invoices_df.columns:
+                invoices_df[c] = invoices_df[c].astype('category')
+
+    # Arrow-backed strings for the dish names: .str.contains then runs
+    # through Arrow's vectorized regex kernel instead of Python re per row
+    if not sales_df.empty:
+        if 'name' in sales_df.columns:
+            sales_df['name'] = sales_df['name'].astype('string[pyarrow]')
+        if 'category' in sales_df.columns:
+            sales_df['category'] = sales_df['category'].astype('category')
+
+    # Filter the per-ingredient views once; display functions reuse the slices
+    views = _build_views(sales_df, invoices_df)
+    stats = _compute_ingredient_stats(views)
+
+    # Server-side overview aggregates (single RPC) when browsing the
+    # database with a date range; {} falls back to the local stats
+    if supabase and db_has_data and not disable_date_filter:
+        overview_metrics = _cached_overview_metrics(start_date, end_date)
+    else:
+        overview_metrics = {}
+
     # Display tabs for different analyses
     tab1, tab2, tab3, tab4 = st.tabs([
         "📊 Overview / 概要",
@@ -411,22 +704,31 @@ def main():
     ])
     
     with tab1:
-        display_overview(sales_df, invoices_df, beef_per_serving, caviar_per_serving)
-    
+        display_overview(views, stats, beef_per_serving, caviar_per_serving, overview_metrics)
+
     with tab2:
-        display_beef_analysis(sales_df, invoices_df, beef_per_serving)
-    
+        display_beef_analysis(views, stats, beef_per_serving)
+
     with tab3:
-        display_caviar_analysis(sales_df, invoices_df, caviar_per_serving)
+        display_caviar_analysis(views, stats, caviar_per_serving)
     
     with tab4:
         display_vendor_items(invoices_df)
 
 
-def display_overview(sales_df, invoices_df, beef_per_serving, caviar_per_serving):
-    """Display overview dashboard"""
+@st.fragment
+def display_overview(views, stats, beef_per_serving, caviar_per_serving, metrics=None):
+    """Display overview dashboard (metrics: server-side aggregates, optional)"""
     st.header("📊 Overview / 概要")
-    
+
+    sales_df = views['sales']
+    invoices_df = views['invoices']
+    metrics = metrics or {}
+
+    if not metrics and sales_df.empty and invoices_df.empty:
+        st.info("No data available in selected period / 選択期間にデータがありません")
+        return
+
     # DEBUG: Show raw data stats
     with st.expander("🔍 DEBUG: Raw Data Check", expanded=True):
         st.write(f"**Total rows in sales_df:** {len(sales_df)}")
@@ -436,77 +738,61 @@ def display_overview(sales_df, invoices_df, beef_per_serving, caviar_per_serving
             st.write(sales_df['name'].head(10).tolist())
             
             # Check for Beef Tenderloin specifically
-            beef_mask = sales_df['name'].str.contains('Beef Tenderloin', case=False, na=False)
+            # Reuse the precomputed mask; index the qty values directly
+            # instead of materializing a filtered frame
+            beef_mask = views['beef_sales_mask'].to_numpy()
             st.write(f"**Rows matching 'Beef Tenderloin':** {beef_mask.sum()}")
-            
-            beef_sales_debug = sales_df[beef_mask]
-            if not beef_sales_debug.empty:
-                st.write(f"**Beef qty values:** {beef_sales_debug['qty'].tolist()}")
-                st.write(f"**Beef qty sum:** {beef_sales_debug['qty'].sum()}")
+
+            beef_qty = sales_df['qty'].to_numpy()[beef_mask]
+            if beef_qty.size:
+                st.write(f"**Beef qty values:** {beef_qty.tolist()}")
+                st.write(f"**Beef qty sum:** {beef_qty.sum()}")
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("🥩 Beef Tenderloin")
-        if not sales_df.empty:
-            beef_sales = sales_df[sales_df['name'].str.contains('Beef Tenderloin', case=False, na=False)]
-            total_beef_qty = beef_sales['qty'].sum()
-            
-            # Calculate revenue with fixed dinner price ¥5,682
-            beef_dinner_price = 5682
-            beef_sales_calc = beef_sales.copy()
-            beef_sales_calc['calc_price'] = beef_sales_calc.apply(
-                lambda row: beef_dinner_price if row['price'] == 0 or pd.isna(row['price']) else row['price'],
-                axis=1
-            )
-            beef_sales_calc['calc_revenue'] = beef_sales_calc.apply(
-                lambda row: row['net_total'] if row['net_total'] != 0 else row['qty'] * row['calc_price'],
-                axis=1
-            )
-            total_beef_revenue = beef_sales_calc['calc_revenue'].sum()
-            
-            expected_beef_kg = (total_beef_qty * beef_per_serving) / 1000
-            
-            st.metric("Dishes Sold / 販売数", f"{total_beef_qty:.0f}")
-            st.metric("Revenue / 売上", f"¥{total_beef_revenue:,.0f}")
+        if metrics or not sales_df.empty:
+            beef_qty = metrics['beef_qty'] if metrics else stats['beef']['qty']
+            beef_revenue = metrics['beef_revenue'] if metrics else stats['beef']['revenue']
+            expected_beef_kg = (beef_qty * beef_per_serving) / 1000
+
+            st.metric("Dishes Sold / 販売数", f"{beef_qty:.0f}")
+            st.metric("Revenue / 売上", f"¥{beef_revenue:,.0f}")
             st.metric("Expected Usage / 予想使用量", f"{expected_beef_kg:.2f} kg")
-    
+
     with col2:
         st.subheader("🐟 Egg Toast Caviar")
-        if not sales_df.empty:
-            caviar_sales = sales_df[sales_df['name'].str.contains('Egg Toast Caviar', case=False, na=False)]
-            total_caviar_qty = caviar_sales['qty'].sum()
-            
-            # Calculate revenue with fixed dinner price (same as lunch price)
-            caviar_dinner_price = 3247  # Course item estimate
-            caviar_sales_calc = caviar_sales.copy()
-            caviar_sales_calc['calc_price'] = caviar_sales_calc.apply(
-                lambda row: caviar_dinner_price if row['price'] == 0 or pd.isna(row['price']) else row['price'],
-                axis=1
-            )
-            caviar_sales_calc['calc_revenue'] = caviar_sales_calc.apply(
-                lambda row: row['net_total'] if row['net_total'] != 0 else row['qty'] * row['calc_price'],
-                axis=1
-            )
-            total_caviar_revenue = caviar_sales_calc['calc_revenue'].sum()
-            
-            expected_caviar_g = total_caviar_qty * caviar_per_serving
-            
-            st.metric("Dishes Sold / 販売数", f"{total_caviar_qty:.0f}")
-            st.metric("Revenue / 売上", f"¥{total_caviar_revenue:,.0f}")
+        if metrics or not sales_df.empty:
+            caviar_qty = metrics['caviar_qty'] if metrics else stats['caviar']['qty']
+            caviar_revenue = metrics['caviar_revenue'] if metrics else stats['caviar']['revenue']
+            expected_caviar_g = caviar_qty * caviar_per_serving
+
+            st.metric("Dishes Sold / 販売数", f"{caviar_qty:.0f}")
+            st.metric("Revenue / 売上", f"¥{caviar_revenue:,.0f}")
             st.metric("Expected Usage / 予想使用量", f"{expected_caviar_g:.0f} g")
-    
+
     # Purchase summary
     st.subheader("💰 Purchase Summary / 仕入概要")
-    if not invoices_df.empty:
+    if metrics:
+        vendor_rows = metrics.get('vendor_summary') or []
+        if vendor_rows:
+            vendor_summary = pd.DataFrame.from_records(vendor_rows, columns=['vendor', 'total'])
+            vendor_summary.columns = ['Vendor / 仕入先', 'Total / 合計']
+            vendor_summary['Total / 合計'] = _format_yen(vendor_summary['Total / 合計'])
+            st.table(vendor_summary)
+            st.metric("Total Purchases / 仕入合計", f"¥{metrics['total_purchases']:,.0f}")
+        else:
+            st.info("No invoice data in selected period")
+    elif not invoices_df.empty:
         # Group by vendor
-        vendor_summary = invoices_df.groupby('vendor').agg({
+        vendor_summary = invoices_df.groupby('vendor', sort=False, as_index=False, observed=True).agg({
             'amount': 'sum'
-        }).reset_index()
+        })
         vendor_summary.columns = ['Vendor / 仕入先', 'Total / 合計']
-        vendor_summary['Total / 合計'] = vendor_summary['Total / 合計'].apply(lambda x: f"¥{x:,.0f}")
-        st.dataframe(vendor_summary, use_container_width=True)
-        
+        vendor_summary['Total / 合計'] = _format_yen(vendor_summary['Total / 合計'])
+        st.table(vendor_summary)
+
         # Total purchases
         total_purchases = invoices_df['amount'].sum()
         st.metric("Total Purchases / 仕入合計", f"¥{total_purchases:,.0f}")
@@ -514,54 +800,30 @@ def display_overview(sales_df, invoices_df, beef_per_serving, caviar_per_serving
         st.info("No invoice data in selected period")
 
 
-def display_beef_analysis(sales_df, invoices_df, beef_per_serving):
+@st.fragment
+def display_beef_analysis(views, stats, beef_per_serving):
     """Detailed beef tenderloin analysis"""
     st.header("🥩 Beef Tenderloin Analysis / 牛肉分析")
-    
-    # Filter beef data
-    beef_sales = sales_df[sales_df['name'].str.contains('Beef Tenderloin', case=False, na=False)] if not sales_df.empty else pd.DataFrame()
-    beef_invoices = invoices_df[invoices_df['item_name'].str.contains('ヒレ|フィレ|tenderloin|牛', case=False, na=False)] if not invoices_df.empty else pd.DataFrame()
+
+    # Pre-filtered beef data
+    beef_sales = views['beef_sales']
+    beef_invoices = views['beef_invoices']
     
     if beef_sales.empty and beef_invoices.empty:
         st.warning("No beef data available for analysis in selected period")
         return
     
     col1, col2, col3 = st.columns(3)
-    
-    # Fixed price for Beef Tenderloin Dinner course items
-    beef_dinner_price = 5682
-    
-    # Calculate metrics
-    total_sold = beef_sales['qty'].sum() if not beef_sales.empty else 0
-    
-    # Calculate revenue including estimated revenue for course items
-    if not beef_sales.empty:
-        beef_sales_calc = beef_sales.copy()
-        # Use fixed dinner price where price is 0
-        beef_sales_calc['calc_price'] = beef_sales_calc.apply(
-            lambda row: beef_dinner_price if row['price'] == 0 or pd.isna(row['price']) else row['price'],
-            axis=1
-        )
-        # Then calculate revenue: use net_total if exists, otherwise qty * price
-        beef_sales_calc['calc_revenue'] = beef_sales_calc.apply(
-            lambda row: row['net_total'] if row['net_total'] != 0 else row['qty'] * row['calc_price'],
-            axis=1
-        )
-        total_revenue = beef_sales_calc['calc_revenue'].sum()
-    else:
-        total_revenue = 0
-    
+
+    # Precomputed metrics (fixed dinner price applied where price is 0)
+    total_sold = stats['beef']['qty']
+    total_revenue = stats['beef']['revenue']
+    total_purchased_kg = stats['beef']['purchased']
+    total_cost = stats['beef']['cost']
+
     expected_usage_g = total_sold * beef_per_serving
     expected_usage_kg = expected_usage_g / 1000
     
-    # Calculate purchases - handle both kg and individual items
-    if not beef_invoices.empty:
-        total_purchased_kg = beef_invoices['quantity'].sum()
-        total_cost = beef_invoices['amount'].sum()
-    else:
-        total_purchased_kg = 0
-        total_cost = 0
-    
     with col1:
         st.metric("Total Sold / 販売総数", f"{total_sold:.0f} servings")
         st.metric("Total Revenue / 売上合計", f"¥{total_revenue:,.0f}")
@@ -586,127 +848,69 @@ def display_beef_analysis(sales_df, invoices_df, beef_per_serving):
     # Usage comparison chart
     st.subheader("📈 Usage Comparison / 使用量比較")
     
-    comparison_data = pd.DataFrame({
-        'Category': ['Purchased\n仕入量', 'Expected Usage\n予想使用量', 'Potential Waste\n予想ロス'],
-        'Amount (kg)': [total_purchased_kg, expected_usage_kg, max(0, total_purchased_kg - expected_usage_kg)]
-    })
-    
-    fig = px.bar(comparison_data, x='Category', y='Amount (kg)', 
-                 color='Category',
-                 color_discrete_sequence=['#3366cc', '#109618', '#dc3912'])
-    fig.update_layout(showlegend=False)
+    fig = _make_comparison_fig(total_purchased_kg, expected_usage_kg, 'kg')
     st.plotly_chart(fig, use_container_width=True)
     
     # Detailed invoice breakdown
     if not beef_invoices.empty:
         st.subheader("📋 Purchase Details / 仕入明細")
-        display_df = beef_invoices[['date', 'item_name', 'quantity', 'unit', 'amount']].copy()
+        display_df = beef_invoices[['date', 'item_name', 'quantity', 'unit', 'amount']]
         display_df.columns = ['Date/日付', 'Item/品目', 'Qty/数量', 'Unit/単位', 'Amount/金額']
-        display_df['Amount/金額'] = display_df['Amount/金額'].apply(lambda x: f"¥{x:,.0f}")
-        st.dataframe(display_df, use_container_width=True)
+        st.dataframe(display_df, use_container_width=True, column_config=_currency_config(display_df))
     
     # Detailed sales breakdown
     if not beef_sales.empty:
         st.subheader("🍽️ Sales Details / 売上明細")
-        sales_display = beef_sales[['code', 'name', 'category', 'qty', 'price', 'net_total']].copy()
-        
-        # Apply fixed price for Dinner items, keep original for others
-        sales_display['price'] = sales_display.apply(
-            lambda row: beef_dinner_price if (row['price'] == 0 or pd.isna(row['price'])) else row['price'], 
-            axis=1
-        )
-        
-        # Calculate revenue: use net_total if exists, otherwise qty * price
-        sales_display['net_total'] = sales_display.apply(
-            lambda row: row['net_total'] if row['net_total'] != 0 else row['qty'] * row['price'],
-            axis=1
-        )
-        
+        sales_display = beef_sales[['code', 'name', 'category', 'qty', 'price', 'net_total']]
+
+        # Fixed price for Dinner items where price is missing; revenue
+        # from net_total, falling back to qty * price (vectorized)
+        calc_price, calc_revenue = _fill_price_and_revenue(beef_sales, BEEF_DINNER_PRICE)
+        sales_display['price'] = calc_price
+        sales_display['net_total'] = calc_revenue
+
         sales_display.columns = ['Code/コード', 'Item/品目', 'Category/カテゴリ', 'Qty/数量', 'Price/単価', 'Revenue/売上']
-        sales_display['Price/単価'] = sales_display['Price/単価'].apply(lambda x: f"¥{x:,.0f}")
-        sales_display['Revenue/売上'] = sales_display['Revenue/売上'].apply(lambda x: f"¥{x:,.0f}")
-        
+
         # Add note about estimated prices
         st.caption("※ Dinner course items: estimated at ¥5,682/dish")
-        st.dataframe(sales_display, use_container_width=True)
+        st.dataframe(sales_display, use_container_width=True, column_config=_currency_config(sales_display))
         
         # Summary by category
         st.subheader("📊 Sales by Category / カテゴリ別売上")
-        beef_sales_summary = beef_sales.copy()
-        # Use fixed dinner price where price is 0
-        beef_sales_summary['calc_price'] = beef_sales_summary.apply(
-            lambda row: beef_dinner_price if row['price'] == 0 or pd.isna(row['price']) else row['price'],
-            axis=1
-        )
-        # Then calculate revenue: use net_total if exists, otherwise qty * price
-        beef_sales_summary['calc_revenue'] = beef_sales_summary.apply(
-            lambda row: row['net_total'] if row['net_total'] != 0 else row['qty'] * row['calc_price'],
-            axis=1
-        )
-        category_summary = beef_sales_summary.groupby('category').agg({
-            'qty': 'sum',
-            'calc_revenue': 'sum'
-        }).reset_index()
-        category_summary.columns = ['Category/カテゴリ', 'Qty/数量', 'Revenue/売上']
-        category_summary['Revenue/売上'] = category_summary['Revenue/売上'].apply(lambda x: f"¥{x:,.0f}")
-        st.dataframe(category_summary, use_container_width=True)
+        category_summary = _category_summary(beef_sales, BEEF_DINNER_PRICE)
+        category_summary['Revenue/売上'] = _format_yen(category_summary['Revenue/売上'])
+        st.table(category_summary)
 
 
-def display_caviar_analysis(sales_df, invoices_df, caviar_per_serving):
+@st.fragment
+def display_caviar_analysis(views, stats, caviar_per_serving):
     """Detailed caviar analysis"""
     st.header("🐟 Caviar Analysis / キャビア分析")
-    
-    # Filter caviar data
-    caviar_sales = sales_df[sales_df['name'].str.contains('Egg Toast Caviar', case=False, na=False)] if not sales_df.empty else pd.DataFrame()
-    caviar_invoices = invoices_df[invoices_df['item_name'].str.contains('キャビア|KAVIARI|caviar', case=False, na=False)] if not invoices_df.empty else pd.DataFrame()
+
+    # Pre-filtered caviar data
+    caviar_sales = views['caviar_sales']
+    caviar_invoices = views['caviar_invoices']
     
     if caviar_sales.empty and caviar_invoices.empty:
         st.warning("No caviar data available for analysis in selected period")
         return
     
     col1, col2, col3 = st.columns(3)
-    
-    # Course price estimation
-    course_price = 19480.44
-    num_courses = 6
-    estimated_course_item_price = course_price / num_courses
-    
-    # Calculate metrics
-    total_sold = caviar_sales['qty'].sum() if not caviar_sales.empty else 0
-    
-    # Calculate revenue including estimated revenue for course items
-    if not caviar_sales.empty:
-        caviar_sales_calc = caviar_sales.copy()
-        # First fill in price where missing
-        caviar_sales_calc['calc_price'] = caviar_sales_calc.apply(
-            lambda row: estimated_course_item_price if row['price'] == 0 or pd.isna(row['price']) else row['price'],
-            axis=1
-        )
-        # Then calculate revenue: use net_total if exists, otherwise qty * price
-        caviar_sales_calc['calc_revenue'] = caviar_sales_calc.apply(
-            lambda row: row['net_total'] if row['net_total'] != 0 else row['qty'] * row['calc_price'],
-            axis=1
-        )
-        total_revenue = caviar_sales_calc['calc_revenue'].sum()
-    else:
-        total_revenue = 0
-    
+
+    # Precomputed metrics (estimated course-item price applied where price is 0)
+    total_sold = stats['caviar']['qty']
+    total_revenue = stats['caviar']['revenue']
+    total_cost = stats['caviar']['cost']
+
     expected_usage_g = total_sold * caviar_per_serving
-    
+
     # Caviar is typically sold in 100g units, but quantity may be in grams or units
-    if not caviar_invoices.empty:
-        # Check if quantity is in grams (large numbers) or units (small numbers)
-        total_qty = caviar_invoices['quantity'].sum()
-        if total_qty > 100:  # Likely in grams already
-            total_purchased_g = total_qty
-        else:  # Likely in units, convert to grams
-            total_purchased_g = total_qty * 100
-        total_purchased_units = total_purchased_g / 100
-        total_cost = caviar_invoices['amount'].sum()
-    else:
-        total_purchased_g = 0
-        total_purchased_units = 0
-        total_cost = 0
+    total_qty = stats['caviar']['purchased']
+    if total_qty > 100:  # Likely in grams already
+        total_purchased_g = total_qty
+    else:  # Likely in units, convert to grams
+        total_purchased_g = total_qty * 100
+    total_purchased_units = total_purchased_g / 100
     
     with col1:
         st.metric("Total Sold / 販売総数", f"{total_sold:.0f} servings")
@@ -732,78 +936,41 @@ def display_caviar_analysis(sales_df, invoices_df, caviar_per_serving):
     # Usage comparison chart
     st.subheader("📈 Usage Comparison / 使用量比較")
     
-    comparison_data = pd.DataFrame({
-        'Category': ['Purchased\n仕入量', 'Expected Usage\n予想使用量', 'Potential Waste\n予想ロス'],
-        'Amount (g)': [total_purchased_g, expected_usage_g, max(0, total_purchased_g - expected_usage_g)]
-    })
-    
-    fig = px.bar(comparison_data, x='Category', y='Amount (g)', 
-                 color='Category',
-                 color_discrete_sequence=['#3366cc', '#109618', '#dc3912'])
-    fig.update_layout(showlegend=False)
+    fig = _make_comparison_fig(total_purchased_g, expected_usage_g, 'g')
     st.plotly_chart(fig, use_container_width=True)
     
     # Detailed invoice breakdown
     if not caviar_invoices.empty:
         st.subheader("📋 Purchase Details / 仕入明細")
-        display_df = caviar_invoices[['date', 'item_name', 'amount']].copy()
+        display_df = caviar_invoices[['date', 'item_name', 'amount']]
         display_df.columns = ['Date/日付', 'Item/品目', 'Amount/金額']
-        display_df['Amount/金額'] = display_df['Amount/金額'].apply(lambda x: f"¥{x:,.0f}")
-        st.dataframe(display_df, use_container_width=True)
+        st.dataframe(display_df, use_container_width=True, column_config=_currency_config(display_df))
     
     # Detailed sales breakdown
     if not caviar_sales.empty:
         st.subheader("🍽️ Sales Details / 売上明細")
-        sales_display = caviar_sales[['code', 'name', 'category', 'qty', 'price', 'net_total']].copy()
-        
-        # Calculate estimated price for course items (Dinner category with 0 price)
-        # Assume 6-course menu at ¥19,480.44
-        course_price = 19480.44
-        num_courses = 6
-        estimated_course_item_price = course_price / num_courses
-        
-        # Apply estimated price only where price is 0 or missing
-        sales_display['price'] = sales_display.apply(
-            lambda row: estimated_course_item_price if row['price'] == 0 or pd.isna(row['price']) else row['price'], 
-            axis=1
-        )
-        
-        # Calculate revenue: use net_total if exists, otherwise qty * price
-        sales_display['net_total'] = sales_display.apply(
-            lambda row: row['net_total'] if row['net_total'] != 0 else row['qty'] * row['price'],
-            axis=1
-        )
-        
+        sales_display = caviar_sales[['code', 'name', 'category', 'qty', 'price', 'net_total']]
+
+        # Estimated course price where price is missing; revenue from
+        # net_total, falling back to qty * price (vectorized)
+        calc_price, calc_revenue = _fill_price_and_revenue(caviar_sales, CAVIAR_COURSE_ITEM_PRICE)
+        sales_display['price'] = calc_price
+        sales_display['net_total'] = calc_revenue
+
         sales_display.columns = ['Code/コード', 'Item/品目', 'Category/カテゴリ', 'Qty/数量', 'Price/単価', 'Revenue/売上']
-        sales_display['Price/単価'] = sales_display['Price/単価'].apply(lambda x: f"¥{x:,.0f}")
-        sales_display['Revenue/売上'] = sales_display['Revenue/売上'].apply(lambda x: f"¥{x:,.0f}")
-        
+
         # Add note about estimated prices
         st.caption("※ Dinner course items: estimated at ¥19,480 ÷ 6 courses = ¥3,247/dish")
-        st.dataframe(sales_display, use_container_width=True)
+        st.dataframe(sales_display, use_container_width=True, column_config=_currency_config(sales_display))
         
         # Summary by category
         st.subheader("📊 Sales by Category / カテゴリ別売上")
-        caviar_sales_summary = caviar_sales.copy()
-        # First fill in price where missing
-        caviar_sales_summary['calc_price'] = caviar_sales_summary.apply(
-            lambda row: estimated_course_item_price if row['price'] == 0 or pd.isna(row['price']) else row['price'],
-            axis=1
-        )
-        # Then calculate revenue: use net_total if exists, otherwise qty * price
-        caviar_sales_summary['calc_revenue'] = caviar_sales_summary.apply(
-            lambda row: row['net_total'] if row['net_total'] != 0 else row['qty'] * row['calc_price'],
-            axis=1
-        )
-        category_summary = caviar_sales_summary.groupby('category').agg({
-            'qty': 'sum',
-            'calc_revenue': 'sum'
-        }).reset_index()
-        category_summary.columns = ['Category/カテゴリ', 'Qty/数量', 'Revenue/売上']
-        category_summary['Revenue/売上'] = category_summary['Revenue/売上'].apply(lambda x: f"¥{x:,.0f}")
-        st.dataframe(category_summary, use_container_width=True)
+        category_summary = _category_summary(caviar_sales, CAVIAR_COURSE_ITEM_PRICE)
+        category_summary['Revenue/売上'] = _format_yen(category_summary['Revenue/売上'])
+        st.table(category_summary)
 
 
+@st.fragment
 def display_vendor_items(invoices_df):
     """Display all items by vendor"""
     st.header("📋 Vendor Items List / 仕入先品目一覧")
@@ -812,31 +979,34 @@ def display_vendor_items(invoices_df):
         st.info("No invoice data available in selected period. Upload PDF invoices to see vendor items.")
         return
     
-    # Group by vendor
-    vendors = invoices_df['vendor'].unique()
-    
-    for vendor in vendors:
+    # Aggregate all vendor/item summaries in one pass instead of
+    # one groupby per vendor
+    all_summary = invoices_df.groupby(['vendor', 'item_name'], observed=True, sort=False).agg(
+        quantity=('quantity', 'sum'),
+        amount=('amount', 'sum'),
+        first_order=('date', 'min'),
+        last_order=('date', 'max'),
+        order_count=('date', 'count')
+    ).reset_index()
+
+    vendor_groups = invoices_df.groupby('vendor', observed=True, sort=False)
+
+    for vendor, summary in all_summary.groupby('vendor', observed=True, sort=False):
         st.subheader(f"🏪 {vendor}")
-        vendor_items = invoices_df[invoices_df['vendor'] == vendor]
-        
+
         # Summary table
-        summary = vendor_items.groupby('item_name').agg({
-            'quantity': 'sum',
-            'amount': 'sum',
-            'date': ['min', 'max', 'count']
-        }).reset_index()
-        summary.columns = ['Item/品目', 'Total Qty/総数量', 'Total Amount/合計金額', 
+        summary = summary.drop(columns='vendor')
+        summary.columns = ['Item/品目', 'Total Qty/総数量', 'Total Amount/合計金額',
                           'First Order/初回', 'Last Order/最終', 'Order Count/注文回数']
-        summary['Total Amount/合計金額'] = summary['Total Amount/合計金額'].apply(lambda x: f"¥{x:,.0f}")
-        
-        st.dataframe(summary, use_container_width=True)
-        
+        summary['Total Amount/合計金額'] = _format_yen(summary['Total Amount/合計金額'])
+
+        st.table(summary)
+
         # Detailed view expander
         with st.expander(f"View all transactions / 全取引を表示"):
-            detail_df = vendor_items[['date', 'item_name', 'quantity', 'unit', 'unit_price', 'amount']].copy()
+            detail_df = vendor_groups.get_group(vendor)[['date', 'item_name', 'quantity', 'unit', 'unit_price', 'amount']]
             detail_df.columns = ['Date/日付', 'Item/品目', 'Qty/数量', 'Unit/単位', 'Unit Price/単価', 'Amount/金額']
-            detail_df['Amount/金額'] = detail_df['Amount/金額'].apply(lambda x: f"¥{x:,.0f}" if pd.notna(x) else "")
-            st.dataframe(detail_df, use_container_width=True)
+            st.dataframe(detail_df, use_container_width=True, column_config=_currency_config(detail_df))
         
         st.divider()
 
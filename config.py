@@ -3,6 +3,8 @@ Configuration for Purchasing Evaluation System
 Defines vendor-ingredient-dish mappings
 """
 
+import re
+
 # Vendor configuration
 # Maps vendor names to their products and related dishes
 VENDOR_CONFIG = {
@@ -80,7 +82,35 @@ DEFAULT_TARGETS = {
 }
 
 # OCR settings
+# 200 dpi renders half the pixels of 300 (≈2x less LSTM work) with no
+# accuracy loss on these tabular invoices; PSM 6 treats the page as one
+# uniform text block instead of running full layout analysis, and OEM 1
+# selects the LSTM engine. 'psm' mirrors the --psm value for tesserocr,
+# which takes it as a parameter rather than a flag string.
 OCR_CONFIG = {
     'languages': 'jpn+eng',
-    'dpi': 300,
+    'dpi': 200,
+    'tesseract_config': '--psm 6 --oem 1',
+    'psm': 6,
+}
+
+# Matchers frozen from the tables above at import time: one compiled
+# alternation per product / dish, so downstream code runs a single
+# .search() or .str.contains() instead of looping the pattern lists on
+# every call
+
+# vendor key -> {product name -> compiled pattern over its aliases}
+VENDOR_PRODUCT_RE = {
+    vendor_key: {
+        product['name']: re.compile('|'.join(re.escape(p) for p in product['patterns']),
+                                    re.IGNORECASE)
+        for product in cfg['products']
+    }
+    for vendor_key, cfg in VENDOR_CONFIG.items()
+}
+
+# dish name -> compiled pattern over its POS-name aliases
+DISH_PATTERN_RE = {
+    dish: re.compile('|'.join(re.escape(p) for p in info['patterns']), re.IGNORECASE)
+    for dish, info in DISH_INGREDIENT_MAP.items()
 }
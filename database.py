@@ -6,10 +6,33 @@ Handles all data persistence for the Purchasing Evaluation System
 import streamlit as st
 from supabase import create_client, Client
 import pandas as pd
+import pyarrow.parquet as pq
 import re
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from io import BytesIO
 from typing import Optional, List, Dict, Any
 
+# Columnar month snapshots of each table, kept on Supabase Storage so the
+# analytics loads can read Parquet instead of paging rows out of Postgres
+PARQUET_BUCKET = 'snapshots'
+PARQUET_COLUMNS = {
+    'invoices': ['invoice_date', 'vendor', 'item_name', 'quantity', 'unit', 'unit_price', 'amount'],
+    'sales': ['sale_date', 'code', 'item_name', 'category', 'qty', 'price', 'net_total'],
+}
+_DATE_COLUMN = {'invoices': 'invoice_date', 'sales': 'sale_date'}
+
+
+def _partition_path(table: str, year: int, month: int) -> str:
+    return f"{table}/year={year}/month={month:02d}.parquet"
+
+
+def _month_range(start_date: date, end_date: date):
+    """Yield (year, month) pairs covering the inclusive date range"""
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
 
 def init_supabase() -> Optional[Client]:
     """Initialize Supabase client from Streamlit secrets"""
@@ -85,7 +108,10 @@ def save_invoices(supabase: Client, records: List[Dict[str, Any]]) -> int:
                     saved_count += 1
             except Exception as e2:
                 st.warning(f"Error batch saving invoices: {e2}")
-    
+
+    if saved_count:
+        _export_touched_partitions(supabase, 'invoices', [d['invoice_date'] for d in batch_data])
+
     return saved_count
 
 
@@ -161,19 +187,114 @@ def save_sales(supabase: Client, df: pd.DataFrame) -> int:
                             pass  # Skip duplicates or errors
         except Exception as e:
             st.warning(f"Error batch saving sales: {e}")
-    
+
+    if saved_count:
+        _export_touched_partitions(supabase, 'sales', [d['sale_date'] for d in batch_data])
+
     return saved_count
 
 
-def load_invoices(supabase: Client, start_date: Optional[date] = None, 
+def export_parquet_partition(supabase: Client, table: str, year: int, month: int) -> bool:
+    """
+    Snapshot one month of a table to Parquet on Supabase Storage
+    Returns True if the partition was written
+    """
+    if not supabase:
+        return False
+
+    try:
+        date_col = _DATE_COLUMN[table]
+        month_start = date(year, month, 1)
+        next_month = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        month_end = next_month - timedelta(days=1)
+
+        rows = []
+        page_size = 1000
+        offset = 0
+        while True:
+            result = supabase.table(table).select(','.join(PARQUET_COLUMNS[table])).gte(
+                date_col, month_start.isoformat()
+            ).lte(
+                date_col, month_end.isoformat()
+            ).order(date_col).range(offset, offset + page_size - 1).execute()
+
+            if result.data:
+                rows.extend(result.data)
+                if len(result.data) < page_size:
+                    break
+                offset += page_size
+            else:
+                break
+
+        if not rows:
+            return False
+
+        buffer = BytesIO()
+        df = pd.DataFrame(rows, columns=PARQUET_COLUMNS[table])
+        df.to_parquet(buffer, index=False)
+        supabase.storage.from_(PARQUET_BUCKET).upload(
+            _partition_path(table, year, month),
+            buffer.getvalue(),
+            {'content-type': 'application/octet-stream', 'x-upsert': 'true'}
+        )
+        return True
+
+    except Exception:
+        # Storage bucket missing or disabled; Postgres loads still work
+        return False
+
+
+def _export_touched_partitions(supabase: Client, table: str, dates: List[str]):
+    """Refresh the Parquet partitions for every month present in dates"""
+    months = {(d[:4], d[5:7]) for d in dates if len(d) >= 7}
+    for year, month in months:
+        export_parquet_partition(supabase, table, int(year), int(month))
+
+
+def _load_parquet_range(supabase: Client, table: str,
+                        start_date: Optional[date], end_date: Optional[date]) -> Optional[pd.DataFrame]:
+    """
+    Load a date range from the Parquet month snapshots
+    Returns None when a partition is missing so callers fall back to Postgres
+    """
+    if not supabase or not start_date or not end_date:
+        return None
+
+    try:
+        storage = supabase.storage.from_(PARQUET_BUCKET)
+        frames = []
+        for year, month in _month_range(start_date, end_date):
+            data = storage.download(_partition_path(table, year, month))
+            frames.append(pq.read_table(BytesIO(data), columns=PARQUET_COLUMNS[table]).to_pandas())
+    except Exception:
+        return None
+
+    if not frames:
+        return None
+
+    df = pd.concat(frames, ignore_index=True, sort=False)
+    # Partition granularity is a month; trim to the exact range
+    # (ISO date strings compare correctly as strings)
+    date_col = _DATE_COLUMN[table]
+    dates = df[date_col].astype(str)
+    return df[(dates >= start_date.isoformat()) & (dates <= end_date.isoformat())]
+
+
+def load_invoices(supabase: Client, start_date: Optional[date] = None,
                   end_date: Optional[date] = None, vendor: Optional[str] = None) -> pd.DataFrame:
     """
     Load invoices from Supabase with optional filters
-    Uses pagination to get ALL rows
+    Reads the columnar Parquet snapshots when they cover the range,
+    otherwise paginates the rows out of Postgres
     """
     if not supabase:
         return pd.DataFrame()
-    
+
+    if vendor is None:
+        snapshot = _load_parquet_range(supabase, 'invoices', start_date, end_date)
+        if snapshot is not None:
+            return snapshot.rename(columns={'invoice_date': 'date'})
+
     try:
         all_data = []
         page_size = 1000
@@ -219,11 +340,17 @@ def load_sales(supabase: Client, start_date: Optional[date] = None,
                end_date: Optional[date] = None, item_filter: Optional[str] = None) -> pd.DataFrame:
     """
     Load sales from Supabase with optional filters
-    Uses pagination to get ALL rows (Supabase default limit is 1000)
+    Reads the columnar Parquet snapshots when they cover the range,
+    otherwise paginates the rows out of Postgres
     """
     if not supabase:
         return pd.DataFrame()
-    
+
+    if item_filter is None:
+        snapshot = _load_parquet_range(supabase, 'sales', start_date, end_date)
+        if snapshot is not None:
+            return snapshot.rename(columns={'sale_date': 'date', 'item_name': 'name'})
+
     try:
         all_data = []
         page_size = 1000
@@ -302,24 +429,52 @@ def get_date_range(supabase: Client) -> tuple:
 def get_data_summary(supabase: Client) -> Dict[str, Any]:
     """
     Get summary statistics of stored data
+
+    Tries the get_data_summary() Postgres function first (one round-trip
+    instead of several). Create it with:
+
+        CREATE OR REPLACE FUNCTION get_data_summary() RETURNS json AS $$
+          SELECT json_build_object(
+            'invoice_count', (SELECT count(*) FROM invoices),
+            'sales_count', (SELECT count(*) FROM sales),
+            'min_date', LEAST((SELECT min(invoice_date) FROM invoices),
+                              (SELECT min(sale_date) FROM sales)),
+            'max_date', GREATEST((SELECT max(invoice_date) FROM invoices),
+                                 (SELECT max(sale_date) FROM sales)),
+            'beef_total_in_db', (SELECT coalesce(sum(qty), 0) FROM sales
+                                 WHERE item_name ILIKE '%Beef Tenderloin%'))
+        $$ LANGUAGE sql STABLE;
+
+    Falls back to the per-table queries if the function is not installed.
     """
     if not supabase:
         return {}
-    
+
+    try:
+        result = supabase.rpc('get_data_summary').execute()
+        if result.data:
+            summary = result.data
+            for key in ('min_date', 'max_date'):
+                if summary.get(key):
+                    summary[key] = datetime.fromisoformat(summary[key]).date()
+            return summary
+    except Exception:
+        pass  # Function not installed; fall back to individual queries
+
     try:
         # Count invoices
         inv_count = supabase.table('invoices').select('id', count='exact').execute()
-        
+
         # Count sales
         sales_count = supabase.table('sales').select('id', count='exact').execute()
-        
+
         # Get date range
         min_date, max_date = get_date_range(supabase)
-        
+
         # Get beef tenderloin total (for debugging)
         beef_result = supabase.table('sales').select('qty').ilike('item_name', '%Beef Tenderloin%').execute()
         beef_total = sum(float(r['qty']) for r in beef_result.data) if beef_result.data else 0
-        
+
         return {
             'invoice_count': inv_count.count if inv_count else 0,
             'sales_count': sales_count.count if sales_count else 0,
@@ -327,13 +482,59 @@ def get_data_summary(supabase: Client) -> Dict[str, Any]:
             'max_date': max_date,
             'beef_total_in_db': beef_total
         }
-        
+
     except Exception as e:
         st.error(f"Error getting summary: {e}")
         return {}
 
 
-def delete_data_by_date_range(supabase: Client, start_date: date, end_date: date, 
+def get_overview_metrics(supabase: Client, start_date: Optional[date] = None,
+                         end_date: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Aggregate the overview numbers server-side in one round-trip so the
+    overview tab ships totals, not raw rows
+
+    Requires the get_overview_metrics(p_start date, p_end date) Postgres
+    function (fallback prices mirror the course-item constants in app.py):
+
+        CREATE OR REPLACE FUNCTION get_overview_metrics(p_start date, p_end date)
+        RETURNS json AS $$
+          WITH s AS (SELECT * FROM sales WHERE sale_date BETWEEN p_start AND p_end),
+               i AS (SELECT * FROM invoices WHERE invoice_date BETWEEN p_start AND p_end)
+          SELECT json_build_object(
+            'beef_qty', (SELECT coalesce(sum(qty), 0) FROM s
+                         WHERE item_name ILIKE '%Beef Tenderloin%'),
+            'beef_revenue', (SELECT coalesce(sum(CASE WHEN net_total <> 0 THEN net_total
+                                  ELSE qty * (CASE WHEN price = 0 THEN 5682 ELSE price END) END), 0)
+                             FROM s WHERE item_name ILIKE '%Beef Tenderloin%'),
+            'caviar_qty', (SELECT coalesce(sum(qty), 0) FROM s
+                           WHERE item_name ILIKE '%Egg Toast Caviar%'),
+            'caviar_revenue', (SELECT coalesce(sum(CASE WHEN net_total <> 0 THEN net_total
+                                    ELSE qty * (CASE WHEN price = 0 THEN 3246.74 ELSE price END) END), 0)
+                               FROM s WHERE item_name ILIKE '%Egg Toast Caviar%'),
+            'total_purchases', (SELECT coalesce(sum(amount), 0) FROM i),
+            'vendor_summary', (SELECT coalesce(json_agg(v), '[]')
+                               FROM (SELECT vendor, sum(amount) AS total
+                                     FROM i GROUP BY vendor) v))
+        $$ LANGUAGE sql STABLE;
+
+    Returns {} when the function is not installed or no range is given,
+    so callers fall back to client-side aggregation.
+    """
+    if not supabase or not start_date or not end_date:
+        return {}
+
+    try:
+        result = supabase.rpc('get_overview_metrics', {
+            'p_start': start_date.isoformat(),
+            'p_end': end_date.isoformat()
+        }).execute()
+        return result.data or {}
+    except Exception:
+        return {}
+
+
+def delete_data_by_date_range(supabase: Client, start_date: date, end_date: date,
                                table: str = 'both') -> Dict[str, int]:
     """
     Delete data within a date range
@@ -361,8 +562,19 @@ def delete_data_by_date_range(supabase: Client, start_date: date, end_date: date
                 'sale_date', end_date.isoformat()
             ).execute()
             deleted['sales'] = len(result.data) if result.data else 0
-            
+
     except Exception as e:
         st.error(f"Error deleting data: {e}")
-    
+
+    # Refresh the Parquet snapshots for the affected months; drop the
+    # partition first so a fully-deleted month doesn't linger as stale data
+    for table_name in ('invoices', 'sales'):
+        if deleted[table_name]:
+            for year, month in _month_range(start_date, end_date):
+                try:
+                    supabase.storage.from_(PARQUET_BUCKET).remove([_partition_path(table_name, year, month)])
+                except Exception:
+                    pass
+                export_parquet_partition(supabase, table_name, year, month)
+
     return deleted
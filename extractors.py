@@ -7,12 +7,62 @@ Handles:
 
 import pandas as pd
 import re
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from io import BytesIO
-import tempfile
+from io import BytesIO, StringIO
 import os
 
-# PDF processing
+from config import OCR_CONFIG, VENDOR_CONFIG
+
+# Precompiled patterns shared by the parsers; hoisted to module load so
+# the per-line loops skip the re-cache lookup and pattern hashing
+_RE_HEADER_DATE = re.compile(r'(\d{4})-(\d{2})-\d{2}')
+_RE_MONTH_JP = re.compile(r'(\d{4})年\s*(\d{1,2})月')
+_RE_ALL_NUMS = re.compile(r'(\d+\.?\d*)')
+# A Hirayama entry token is either a slip date (group 1) or a decimal kg
+# quantity (group 2); one finditer pass replaces the per-line date scan
+# plus qty scan, with order of appearance standing in for line order
+_RE_HIRAYAMA_ENTRY = re.compile(r'(\d{2}/\d{2}/\d{2})|(\d+\.\d+)\s*(?:kg|ke)', re.IGNORECASE)
+_RE_AMOUNT_TAIL = re.compile(r'\\?([\d,]+)\s*\\?0?\s*\\?([\d,]+)?$')
+_RE_QTY_CAN = re.compile(r'(\d+)\s*缶\s*\\?([\d,]+)')
+_RE_QTY_PC = re.compile(r'(\d+)\s*PC\s*\\?([\d,]+)')
+_RE_QTY_KG_INT = re.compile(r'(\d+)\s*kg\s*\\?([\d,]+)')
+_RE_QTY_BOTTLE = re.compile(r'(\d+)\s*本\s*\\?([\d,]+)')
+
+# Non-data rows in the POS sales report (subtotals, section headers, etc.)
+SKIP_ROW_MARKERS = ('Total:', 'Sub Total:', 'Outlet Total:', 'Shop Total:',
+                    'Grand Total', 'END OF REPORT', 'Department:', 'Outlet:',
+                    'Check Type:')
+
+
+def _build_vendor_token_re():
+    """
+    One alternation over every vendor name and product pattern in
+    VENDOR_CONFIG, with a named group per vendor. Content-based vendor
+    detection is then a single scan of the text rather than one
+    substring search per token, and picking up a new vendor is a config
+    change rather than another branch in _detect_vendor
+    """
+    groups = []
+    for vendor_key, cfg in VENDOR_CONFIG.items():
+        tokens = set(cfg['names'])
+        for product in cfg['products']:
+            tokens.update(product['patterns'])
+        alternation = '|'.join(re.escape(t) for t in sorted(tokens, key=len, reverse=True))
+        groups.append(f'(?P<{vendor_key}>{alternation})')
+    return re.compile('|'.join(groups), re.IGNORECASE)
+
+
+_VENDOR_TOKEN_RE = _build_vendor_token_re()
+
+# PDF processing; PyMuPDF's C-backed extractor is preferred for the raw
+# text we need, with pdfplumber (pure-Python pdfminer) as fallback
+try:
+    import pymupdf
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+
 try:
     import pdfplumber
     PDFPLUMBER_AVAILABLE = True
@@ -21,12 +71,20 @@ except ImportError:
 
 # OCR for scanned PDFs
 try:
-    from pdf2image import convert_from_path, convert_from_bytes
+    from pdf2image import convert_from_bytes
     import pytesseract
     OCR_AVAILABLE = True
 except ImportError:
     OCR_AVAILABLE = False
 
+# Persistent Tesseract API: loads the LSTM model once per document
+# instead of spawning a tesseract subprocess per page
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
 
 def extract_sales_data(uploaded_file) -> pd.DataFrame:
     """
@@ -40,92 +98,76 @@ def extract_sales_data(uploaded_file) -> pd.DataFrame:
         content = uploaded_file.read()
         uploaded_file.seek(0)  # Reset for potential re-read
         
-        # Decode content - handle Windows line endings
-        text_content = content.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+        # Normalize Windows/Mac line endings on the raw bytes, then
+        # decode once — no UTF-8 continuation byte can equal 0x0D, so the
+        # bytes-level replace is safe and skips the large intermediate
+        # str reallocations
+        text_content = content.replace(b'\r\n', b'\n').replace(b'\r', b'\n').decode('utf-8')
         lines = text_content.strip().split('\n')
         
         # Extract date range from header
         month_str = None
         for line in lines[:10]:
-            date_match = re.search(r'(\d{4})-(\d{2})-\d{2}', line)
+            date_match = _RE_HEADER_DATE.search(line)
             if date_match:
                 month_str = f"{date_match.group(1)}-{date_match.group(2)}"
                 break
         
-        # Process data rows
-        records = []
-        in_data_section = False
-        
-        for line in lines:
-            # Parse CSV line (handle quoted fields with commas)
-            fields = []
-            in_quote = False
-            current_field = ""
-            for char in line:
-                if char == '"':
-                    in_quote = not in_quote
-                elif char == ',' and not in_quote:
-                    fields.append(current_field.strip().strip('"'))
-                    current_field = ""
-                else:
-                    current_field += char
-            fields.append(current_field.strip().strip('"'))
-            
-            # Check if this is a header row
+        # Find the header row, then hand everything after it to
+        # pd.read_csv: the C tokenizer parses the whole block at once
+        # instead of a per-row, per-cell Python loop
+        header_idx = None
+        for i, line in enumerate(lines):
+            fields = line.split(',')
             if len(fields) >= 8 and 'Code' in fields[0] and 'Name' in fields[1]:
-                in_data_section = True
-                continue
-            
-            if not in_data_section:
-                continue
-            
-            # Skip non-data rows
-            row_str = ' '.join(fields)
-            if any(skip in row_str for skip in ['Total:', 'Sub Total:', 'Outlet Total:', 'Shop Total:', 'Grand Total', 'END OF REPORT', 'Department:', 'Outlet:', 'Check Type:']):
-                continue
-            
-            # Need at least 11 fields for our columns
-            if len(fields) < 11:
-                continue
-            
-            code = fields[0].strip()
-            name = fields[1].strip()
-            
-            # Skip empty or invalid rows
-            if not code or not name or code == 'Code':
-                continue
-            
-            try:
-                category = fields[3].strip() if len(fields) > 3 else ''
-                qty_str = fields[6].replace(',', '') if len(fields) > 6 else '0'
-                gross_str = fields[7].replace(',', '') if len(fields) > 7 else '0'
-                discount_str = fields[8].replace(',', '') if len(fields) > 8 else '0'
-                net_str = fields[10].replace(',', '') if len(fields) > 10 else '0'
-                price_str = fields[5].replace(',', '') if len(fields) > 5 else '0'
-                
-                # Parse numeric values
-                qty = float(qty_str) if qty_str else 0
-                gross_total = float(gross_str) if gross_str else 0
-                discount = float(discount_str) if discount_str else 0
-                net_total = float(net_str) if net_str else 0
-                price = float(price_str) if price_str else 0
-                
-                records.append({
-                    'code': code,
-                    'name': name,
-                    'category': category,
-                    'qty': qty,
-                    'price': price,
-                    'gross_total': gross_total,
-                    'discount': discount,
-                    'net_total': net_total,
-                    'month': month_str
-                })
-            except (ValueError, IndexError) as e:
-                continue
-        
-        result_df = pd.DataFrame(records)
-        return result_df
+                header_idx = i
+                break
+        if header_idx is None:
+            return pd.DataFrame()
+
+        # Pin the schema to the header row's width: without names= the C
+        # parser locks onto the first body line, and a short section row
+        # there ('Department: Food', ...) would turn every full-width
+        # data row into a skipped "bad line". Pinned, short rows are
+        # NaN-padded and fall to the net_total/marker masks below; rows
+        # wider than the header are still dropped by on_bad_lines, which
+        # the POS report never emits
+        width = max(len(lines[header_idx].split(',')), 11)
+        df = pd.read_csv(StringIO('\n'.join(lines[header_idx + 1:])),
+                         header=None, names=range(width), dtype=str, engine='c',
+                         skipinitialspace=True, on_bad_lines='skip')
+        if df.empty:
+            return pd.DataFrame()
+
+        df = df.iloc[:, [0, 1, 3, 6, 5, 7, 8, 10]]
+        df.columns = ['code', 'name', 'category', 'qty', 'price',
+                      'gross_total', 'discount', 'net_total']
+        for col in ('code', 'name', 'category'):
+            df[col] = df[col].str.strip()
+
+        # Drop subtotal/section/invalid rows in one vectorized pass;
+        # the markers only ever lead a row's first two fields, so a
+        # startswith against the whole tuple beats a substring scan per
+        # marker. Rows short of 11 fields surface as a missing net_total
+        marker_mask = (df['code'].str.startswith(SKIP_ROW_MARKERS, na=False)
+                       | df['name'].str.startswith(SKIP_ROW_MARKERS, na=False))
+        df = df[~marker_mask
+                & df['net_total'].notna()
+                & df['code'].notna() & (df['code'] != '') & (df['code'] != 'Code')
+                & df['name'].notna() & (df['name'] != '')]
+
+        for col in ('qty', 'price', 'gross_total', 'discount', 'net_total'):
+            df[col] = pd.to_numeric(df[col].str.replace(',', '', regex=False),
+                                    errors='coerce').fillna(0.0).astype('float64')
+        df['month'] = month_str
+
+        # Low-cardinality string columns carry one dictionary code per
+        # row as categoricals instead of a Python str object each, which
+        # also turns later groupby('category') hashing into int compares
+        df['category'] = df['category'].fillna('').astype('category')
+        df['month'] = df['month'].astype('category')
+
+        return df.reset_index(drop=True)
     
     except Exception as e:
         print(f"Error extracting sales data: {e}")
@@ -134,6 +176,52 @@ def extract_sales_data(uploaded_file) -> pd.DataFrame:
         return pd.DataFrame()
 
 
+def _ocr_page(image) -> str:
+    """OCR a single page image; module-level so it pickles for process pools"""
+    return pytesseract.image_to_string(image, lang=OCR_CONFIG['languages'],
+                                       config=OCR_CONFIG['tesseract_config'])
+
+
+def _ocr_images(images) -> list:
+    """
+    OCR a document's page images. Prefers one persistent tesserocr API
+    for all pages; falls back to pytesseract (in a process pool for
+    multi-page scans, since each call is its own subprocess).
+    """
+    if TESSEROCR_AVAILABLE:
+        with tesserocr.PyTessBaseAPI(lang=OCR_CONFIG['languages'],
+                                     psm=OCR_CONFIG['psm'],
+                                     oem=tesserocr.OEM.LSTM_ONLY) as api:
+            texts = []
+            for image in images:
+                api.SetImage(image)
+                texts.append(api.GetUTF8Text())
+            return texts
+
+    if len(images) > 1:
+        workers = max(1, min(len(images), (os.cpu_count() or 1) // 4))
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            return list(ex.map(_ocr_page, images))
+    return [_ocr_page(image) for image in images]
+
+
+def _detect_vendor(filename: str, text: str):
+    """
+    Map a filename plus whatever text is available so far to the vendor
+    parser; returns None while the vendor is still unknown
+    """
+    if 'hirayama' in filename or 'meat' in filename or 'ひら山' in text:
+        return parse_hirayama_invoice
+    if 'french' in filename or 'fnb' in filename or 'caviar' in filename or 'フレンチ' in text:
+        return parse_french_fnb_invoice
+    # Auto-detect based on content: single pass against every configured
+    # vendor token, leftmost match wins
+    match = _VENDOR_TOKEN_RE.search(text)
+    if match:
+        return _VENDOR_PARSERS[match.lastgroup]
+    return None
+
+
 def extract_invoice_data(uploaded_file) -> list:
     """
     Extract invoice data from PDF or Excel file
@@ -150,55 +238,79 @@ def extract_invoice_data(uploaded_file) -> list:
     
     # Handle PDF files
     try:
-        # Save uploaded file to temp location
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-            tmp.write(uploaded_file.read())
-            tmp_path = tmp.name
-        
+        # Read the upload once and work in memory: pdfplumber and
+        # pdf2image both accept bytes, so the PDF never hits disk and
+        # the rastered pages go straight to Tesseract as PIL images
+        content = uploaded_file.read()
         uploaded_file.seek(0)  # Reset for potential re-read
-        
-        # First try text extraction with pdfplumber
-        text_content = ""
-        if PDFPLUMBER_AVAILABLE:
+
+        # First extract embedded text, preferring PyMuPDF and falling
+        # back to pdfplumber
+        parser = _detect_vendor(filename, "")
+        raw_pages = []
+        if PYMUPDF_AVAILABLE:
             try:
-                with pdfplumber.open(tmp_path) as pdf:
-                    for page in pdf.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text_content += page_text + "\n"
+                with pymupdf.open(stream=content, filetype='pdf') as doc:
+                    raw_pages = [page.get_text() for page in doc]
+            except Exception as e:
+                print(f"pymupdf error: {e}")
+        if not raw_pages and PDFPLUMBER_AVAILABLE:
+            try:
+                with pdfplumber.open(BytesIO(content)) as pdf:
+                    raw_pages = [page.extract_text() or "" for page in pdf.pages]
             except Exception as e:
                 print(f"pdfplumber error: {e}")
-        
-        # If no text found, try OCR
-        if not text_content.strip() and OCR_AVAILABLE:
+
+        # Judge each page on its own — under ~50 chars means a blank or
+        # image page (or a few junk characters from a partial scan), so
+        # that page is flagged for OCR without disqualifying the pages
+        # that do have text
+        page_texts = []
+        pages_needing_ocr = []
+        for i, page_text in enumerate(raw_pages):
+            page_text = page_text.strip()
+            if len(page_text) < 50:
+                pages_needing_ocr.append(i)
+                page_texts.append("")
+            else:
+                page_texts.append(page_text)
+                if parser is None:
+                    parser = _detect_vendor(filename, page_text)
+
+        # OCR only the flagged pages (or everything if pdfplumber is
+        # missing); pages with real text skip the raster + OCR cost
+        if OCR_AVAILABLE and (pages_needing_ocr or not page_texts):
             try:
-                images = convert_from_path(tmp_path, dpi=300)
-                for img in images:
-                    text_content += pytesseract.image_to_string(img, lang='jpn+eng') + "\n"
+                if pages_needing_ocr:
+                    images = []
+                    for i in pages_needing_ocr:
+                        images.extend(convert_from_bytes(
+                            content, dpi=OCR_CONFIG['dpi'],
+                            first_page=i + 1, last_page=i + 1))
+                    for i, ocr_text in zip(pages_needing_ocr, _ocr_images(images)):
+                        page_texts[i] = ocr_text
+                else:
+                    page_texts = _ocr_images(convert_from_bytes(
+                        content, dpi=OCR_CONFIG['dpi'], thread_count=4))
             except Exception as e:
                 print(f"OCR error: {e}")
-        
-        # Clean up temp file
-        os.unlink(tmp_path)
+
+        text_content = "\n".join(t for t in page_texts if t)
+        if text_content:
+            text_content += "\n"
         
         if not text_content.strip():
             print("No text could be extracted from PDF")
             return []
         
-        # Determine vendor and parse accordingly
-        if 'hirayama' in filename or 'meat' in filename or 'ひら山' in text_content:
-            return parse_hirayama_invoice(text_content)
-        elif 'french' in filename or 'fnb' in filename or 'caviar' in filename or 'フレンチ' in text_content:
-            return parse_french_fnb_invoice(text_content)
-        else:
-            # Try to auto-detect based on content
-            if 'キャビア' in text_content or 'KAVIARI' in text_content:
-                return parse_french_fnb_invoice(text_content)
-            elif '和牛ヒレ' in text_content or 'ひら山' in text_content:
-                return parse_hirayama_invoice(text_content)
-            else:
-                print(f"Unknown vendor format in file: {filename}")
-                return []
+        # Determine vendor and parse accordingly (OCR text may reveal a
+        # vendor that the streamed pdfplumber pass did not)
+        if parser is None:
+            parser = _detect_vendor(filename, text_content)
+        if parser is None:
+            print(f"Unknown vendor format in file: {filename}")
+            return []
+        return parser(text_content)
     
     except Exception as e:
         print(f"Error extracting invoice data: {e}")
@@ -305,88 +417,82 @@ def parse_hirayama_invoice(text: str) -> list:
     
     OCR output is often messy, so we use multiple strategies to extract data.
     """
-    records = []
-    
+    # Entries accumulate as parallel date/qty lists — the constant
+    # vendor/item/price fields are stamped on once when the dicts are
+    # built at the end, instead of being copied into every append
+    dates = []
+    qtys = []
+
     # Extract invoice month/year
-    month_match = re.search(r'(\d{4})年(\d{1,2})月', text)
+    month_match = _RE_MONTH_JP.search(text)
     invoice_year = month_match.group(1) if month_match else "2025"
     invoice_month = month_match.group(2).zfill(2) if month_match else "10"
-    
-    seen_qtys = set()  # Track seen quantities to avoid duplicates
-    
-    # Strategy 1: Find all decimal numbers that look like beef quantities (4-10 kg range)
-    # Then match them with nearby amounts
-    all_numbers = re.findall(r'(\d+\.?\d*)', text)
-    
-    potential_qtys = []
-    for num_str in all_numbers:
+
+    seen_qtys = set()  # Seen quantities keyed as int(qty*100) to avoid duplicates
+
+    # Primary strategy: look for date-qty patterns in the messy text in
+    # one fused pass, tracking the most recent date seen
+    # OCR example: "25/10/09 002077 |和生ヒレ | 8% 6.30 kg 12,000 75,600"
+    current_date = f"{invoice_year}-{invoice_month}-01"
+
+    for match in _RE_HIRAYAMA_ENTRY.finditer(text.replace('|', ' ')):
+        date_str, qty_str = match.group(1), match.group(2)
+
+        if date_str:
+            year, month, day = date_str.split('/')  # YY/MM/DD
+            current_date = f"20{year}-{month}-{day}"
+            continue
+
         try:
-            num = float(num_str)
-            # Beef quantities are typically 5-8 kg per delivery
-            if 4.0 <= num <= 10.0 and '.' in num_str:
-                potential_qtys.append(num)
+            qty = float(qty_str)
         except ValueError:
             continue
+
+        # Filter for valid beef quantities
+        if 4.0 <= qty <= 10.0:
+            # Avoid duplicates (same quantity = likely same entry);
+            # integer keys hash cheaper than rounded floats
+            qty_key = int(qty * 100 + 0.5)
+            if qty_key not in seen_qtys:
+                seen_qtys.add(qty_key)
+                dates.append(current_date)
+                qtys.append(qty)
     
-    # Strategy 2: Look for date-qty patterns in the messy text
-    # OCR example: "25/10/09 002077 |和生ヒレ | 8% 6.30 kg 12,000 75,600"
-    lines = text.replace('|', ' ').split('\n')
-    
-    current_date = f"{invoice_year}-{invoice_month}-01"
-    
-    for line in lines:
-        # Try to extract date
-        date_match = re.search(r'(\d{2})/(\d{2})/(\d{2})', line)
-        if date_match:
-            current_date = f"20{date_match.group(1)}-{date_match.group(2)}-{date_match.group(3)}"
-        
-        # Look for quantity patterns in this line
-        # Match: decimal number followed by kg (with possible noise)
-        qty_matches = re.findall(r'(\d+\.\d+)\s*(?:kg|ke|Kg)', line, re.IGNORECASE)
-        
-        for qty_str in qty_matches:
+    # Fallback: if the date-qty pass came up short, scan every number in
+    # the text for values in the beef quantity range. Only run on demand
+    # — the common path skips a full findall plus a Python loop over
+    # every number on the page
+    if len(qtys) < 10:
+        potential_qtys = []
+        for num_str in _RE_ALL_NUMS.findall(text):
             try:
-                qty = float(qty_str)
-                # Filter for valid beef quantities
-                if 4.0 <= qty <= 10.0:
-                    # Avoid duplicates (same quantity = likely same entry)
-                    qty_key = round(qty, 2)
-                    if qty_key not in seen_qtys:
-                        seen_qtys.add(qty_key)
-                        amount = int(qty * 12000)  # Standard wagyu price
-                        
-                        records.append({
-                            'vendor': 'ミートショップひら山 (Meat Shop Hirayama)',
-                            'date': current_date,
-                            'item_name': "和牛ヒレ (Wagyu Tenderloin)",
-                            'quantity': qty,
-                            'unit': 'kg',
-                            'unit_price': 12000,
-                            'amount': amount
-                        })
+                num = float(num_str)
+                # Beef quantities are typically 5-8 kg per delivery
+                if 4.0 <= num <= 10.0 and '.' in num_str:
+                    potential_qtys.append(num)
             except ValueError:
                 continue
-    
-    # Strategy 3: If still not enough records, use potential_qtys we found earlier
-    if len(records) < 10:
+
         for qty in potential_qtys:
-            qty_key = round(qty, 2)
+            qty_key = int(qty * 100 + 0.5)
             if qty_key not in seen_qtys:
                 seen_qtys.add(qty_key)
-                amount = int(qty * 12000)
-                
-                records.append({
-                    'vendor': 'ミートショップひら山 (Meat Shop Hirayama)',
-                    'date': f"{invoice_year}-{invoice_month}-01",
-                    'item_name': "和牛ヒレ (Wagyu Tenderloin)",
-                    'quantity': qty,
-                    'unit': 'kg',
-                    'unit_price': 12000,
-                    'amount': amount
-                })
-    
-    # Sort by quantity to make output cleaner
-    records.sort(key=lambda x: x['quantity'])
+                dates.append(f"{invoice_year}-{invoice_month}-01")
+                qtys.append(qty)
+
+    # Build the row dicts once, sorted by quantity to make output cleaner
+    records = [
+        {
+            'vendor': 'ミートショップひら山 (Meat Shop Hirayama)',
+            'date': date,
+            'item_name': "和牛ヒレ (Wagyu Tenderloin)",
+            'quantity': qty,
+            'unit': 'kg',
+            'unit_price': 12000,
+            'amount': int(qty * 12000),  # Standard wagyu price
+        }
+        for qty, date in sorted(zip(qtys, dates))
+    ]
     
     # Validation: Check against invoice total if found
     total_match = re.search(r'(?:合計|1,159|159,920|1159920)', text)
@@ -404,10 +510,13 @@ def parse_french_fnb_invoice(text: str) -> list:
     Parse French F&B Japan invoice
     Handles both invoice format and product summary format (商品別金額表)
     """
-    records = []
-    
+    # Parallel item/amount columns; the shared vendor/date/unit fields
+    # are stamped on once when the dicts are built at the end
+    item_names = []
+    amounts = []
+
     # Extract invoice month/year
-    month_match = re.search(r'(\d{4})年\s*(\d{1,2})月', text)
+    month_match = _RE_MONTH_JP.search(text)
     invoice_year = month_match.group(1) if month_match else "2025"
     invoice_month = month_match.group(2).zfill(2) if month_match else "01"
     
@@ -423,41 +532,38 @@ def parse_french_fnb_invoice(text: str) -> list:
         # Look for caviar entries
         if 'キャビア' in line or 'KAVIARI' in line or 'キャヴィア' in line:
             # Try to extract amount
-            amount_match = re.search(r'\\?([\d,]+)\s*\\?0?\s*\\?([\d,]+)?$', line)
+            amount_match = _RE_AMOUNT_TAIL.search(line)
             if amount_match:
                 try:
                     amount = int(amount_match.group(1).replace(',', ''))
-                    records.append({
-                        'vendor': 'フレンチ・エフ・アンド・ビー (French F&B Japan)',
-                        'date': f"{invoice_year}-{invoice_month}-01",
-                        'item_name': "KAVIARI キャビア クリスタル 100g",
-                        'quantity': 1,
-                        'unit': 'pc',
-                        'unit_price': amount,
-                        'amount': amount
-                    })
                 except ValueError:
                     continue
+                item_names.append("KAVIARI キャビア クリスタル 100g")
+                amounts.append(amount)
         
         # Look for butter entries
         elif 'パレット' in line or 'ﾊﾟﾚｯﾄ' in line or 'バター' in line or 'ブール' in line:
-            amount_match = re.search(r'\\?([\d,]+)\s*\\?0?\s*\\?([\d,]+)?$', line)
+            amount_match = _RE_AMOUNT_TAIL.search(line)
             if amount_match:
                 try:
                     amount = int(amount_match.group(1).replace(',', ''))
-                    records.append({
-                        'vendor': 'フレンチ・エフ・アンド・ビー (French F&B Japan)',
-                        'date': f"{invoice_year}-{invoice_month}-01",
-                        'item_name': "パレット バター 20g",
-                        'quantity': 1,
-                        'unit': 'pc',
-                        'unit_price': amount,
-                        'amount': amount
-                    })
                 except ValueError:
                     continue
-    
-    return records
+                item_names.append("パレット バター 20g")
+                amounts.append(amount)
+
+    return [
+        {
+            'vendor': 'フレンチ・エフ・アンド・ビー (French F&B Japan)',
+            'date': f"{invoice_year}-{invoice_month}-01",
+            'item_name': item_name,
+            'quantity': 1,
+            'unit': 'pc',
+            'unit_price': amount,
+            'amount': amount
+        }
+        for item_name, amount in zip(item_names, amounts)
+    ]
 
 
 def parse_french_fnb_product_summary(text: str, invoice_year: str, invoice_month: str) -> list:
@@ -465,7 +571,17 @@ def parse_french_fnb_product_summary(text: str, invoice_year: str, invoice_month
     Parse French F&B product summary format (商品別金額表)
     This format shows: product name, quantity, unit price, total amount
     """
-    records = []
+    # Parallel columns plus a local appender; the shared vendor/date
+    # fields are stamped on once when the dicts are built at the end
+    item_names, quantities, units, unit_prices, amounts = [], [], [], [], []
+
+    def _add(item_name, quantity, unit, amount, unit_qty):
+        item_names.append(item_name)
+        quantities.append(quantity)
+        units.append(unit)
+        unit_prices.append(amount // unit_qty if unit_qty > 0 else amount)
+        amounts.append(amount)
+
     processed_amounts = set()  # Track processed amounts to avoid duplicates
     
     # Parse line by line for more accurate extraction
@@ -478,114 +594,71 @@ def parse_french_fnb_product_summary(text: str, invoice_year: str, invoice_month
         # Caviar: look for lines with 缶 (can) unit and caviar keywords
         if ('キャビア' in line or 'KAVIARI' in line or 'キャヴィア' in line) and '缶' in line:
             # Pattern: quantity缶 + amount (e.g., "22缶 \429,000")
-            qty_match = re.search(r'(\d+)\s*缶\s*\\?([\d,]+)', line)
+            qty_match = _RE_QTY_CAN.search(line)
             if qty_match:
                 try:
                     qty = int(qty_match.group(1))
                     amount = int(qty_match.group(2).replace(',', ''))
-                    
-                    records.append({
-                        'vendor': 'フレンチ・エフ・アンド・ビー (French F&B Japan)',
-                        'date': f"{invoice_year}-{invoice_month}-01",
-                        'item_name': "KAVIARI キャビア クリスタル 100g",
-                        'quantity': qty * 100,  # Convert cans to grams
-                        'unit': 'g',
-                        'unit_price': amount // qty if qty > 0 else amount,
-                        'amount': amount
-                    })
+                    # Convert cans to grams
+                    _add("KAVIARI キャビア クリスタル 100g", qty * 100, 'g', amount, qty)
                 except (ValueError, IndexError):
                     pass
         
         # Also check next line for quantity (sometimes on separate line)
         elif ('キャビア' in line or 'KAVIARI' in line or 'キャヴィア' in line) and i + 1 < len(lines):
             next_line = lines[i + 1]
-            qty_match = re.search(r'(\d+)\s*缶\s*\\?([\d,]+)', next_line)
+            qty_match = _RE_QTY_CAN.search(next_line)
             if qty_match:
                 try:
                     qty = int(qty_match.group(1))
                     amount = int(qty_match.group(2).replace(',', ''))
-                    
-                    records.append({
-                        'vendor': 'フレンチ・エフ・アンド・ビー (French F&B Japan)',
-                        'date': f"{invoice_year}-{invoice_month}-01",
-                        'item_name': "KAVIARI キャビア クリスタル 100g",
-                        'quantity': qty * 100,
-                        'unit': 'g',
-                        'unit_price': amount // qty if qty > 0 else amount,
-                        'amount': amount
-                    })
+                    _add("KAVIARI キャビア クリスタル 100g", qty * 100, 'g', amount, qty)
                     i += 1  # Skip next line
                 except (ValueError, IndexError):
                     pass
         
         # Butter: look for PC unit
         elif ('パレット' in line or 'ﾊﾟﾚｯﾄ' in line or 'バター' in line) and 'PC' in line:
-            qty_match = re.search(r'(\d+)\s*PC\s*\\?([\d,]+)', line)
+            qty_match = _RE_QTY_PC.search(line)
             if qty_match:
                 try:
                     qty = int(qty_match.group(1))
                     amount = int(qty_match.group(2).replace(',', ''))
-                    
-                    records.append({
-                        'vendor': 'フレンチ・エフ・アンド・ビー (French F&B Japan)',
-                        'date': f"{invoice_year}-{invoice_month}-01",
-                        'item_name': "パレット バター 20g",
-                        'quantity': qty,
-                        'unit': 'pc',
-                        'unit_price': amount // qty if qty > 0 else amount,
-                        'amount': amount
-                    })
+                    _add("パレット バター 20g", qty, 'pc', amount, qty)
                 except (ValueError, IndexError):
                     pass
         
         # Also check next line for butter quantity
         elif ('パレット' in line or 'ﾊﾟﾚｯﾄ' in line or 'バター' in line) and i + 1 < len(lines):
             next_line = lines[i + 1]
-            qty_match = re.search(r'(\d+)\s*PC\s*\\?([\d,]+)', next_line)
+            qty_match = _RE_QTY_PC.search(next_line)
             if qty_match:
                 try:
                     qty = int(qty_match.group(1))
                     amount = int(qty_match.group(2).replace(',', ''))
-                    
-                    records.append({
-                        'vendor': 'フレンチ・エフ・アンド・ビー (French F&B Japan)',
-                        'date': f"{invoice_year}-{invoice_month}-01",
-                        'item_name': "パレット バター 20g",
-                        'quantity': qty,
-                        'unit': 'pc',
-                        'unit_price': amount // qty if qty > 0 else amount,
-                        'amount': amount
-                    })
+                    _add("パレット バター 20g", qty, 'pc', amount, qty)
                     i += 1
                 except (ValueError, IndexError):
                     pass
         
         # Mushroom
         elif 'ジロール' in line:
-            qty_match = re.search(r'(\d+)\s*kg\s*\\?([\d,]+)', line)
+            qty_match = _RE_QTY_KG_INT.search(line)
             if not qty_match and i + 1 < len(lines):
-                qty_match = re.search(r'(\d+)\s*kg\s*\\?([\d,]+)', lines[i + 1])
+                qty_match = _RE_QTY_KG_INT.search(lines[i + 1])
             if qty_match:
                 try:
                     qty = int(qty_match.group(1))
                     amount = int(qty_match.group(2).replace(',', ''))
-                    records.append({
-                        'vendor': 'フレンチ・エフ・アンド・ビー (French F&B Japan)',
-                        'date': f"{invoice_year}-{invoice_month}-01",
-                        'item_name': "生 スモールジロール",
-                        'quantity': qty,
-                        'unit': 'kg',
-                        'unit_price': amount // qty if qty > 0 else amount,
-                        'amount': amount
-                    })
+                    _add("生 スモールジロール", qty, 'kg', amount, qty)
                 except (ValueError, IndexError):
                     pass
         
         # Vinegar - be more specific to avoid category matches
         elif ('ヴィネガー' in line or 'ビネガー' in line) and 'シャンパン' in line:
-            qty_match = re.search(r'(\d+)\s*本\s*\\?([\d,]+)', line)
+            qty_match = _RE_QTY_BOTTLE.search(line)
             if not qty_match and i + 1 < len(lines):
-                qty_match = re.search(r'(\d+)\s*本\s*\\?([\d,]+)', lines[i + 1])
+                qty_match = _RE_QTY_BOTTLE.search(lines[i + 1])
             if qty_match:
                 try:
                     qty = int(qty_match.group(1))
@@ -594,21 +667,32 @@ def parse_french_fnb_product_summary(text: str, invoice_year: str, invoice_month
                     key = f"vinegar-{qty}-{amount}"
                     if key not in processed_amounts:
                         processed_amounts.add(key)
-                        records.append({
-                            'vendor': 'フレンチ・エフ・アンド・ビー (French F&B Japan)',
-                            'date': f"{invoice_year}-{invoice_month}-01",
-                            'item_name': "シャンパン ヴィネガー 500ml",
-                            'quantity': qty,
-                            'unit': 'bottle',
-                            'unit_price': amount // qty if qty > 0 else amount,
-                            'amount': amount
-                        })
+                        _add("シャンパン ヴィネガー 500ml", qty, 'bottle', amount, qty)
                 except (ValueError, IndexError):
                     pass
-        
+
         i += 1
-    
-    return records
+
+    return [
+        {
+            'vendor': 'フレンチ・エフ・アンド・ビー (French F&B Japan)',
+            'date': f"{invoice_year}-{invoice_month}-01",
+            'item_name': item_name,
+            'quantity': quantity,
+            'unit': unit,
+            'unit_price': unit_price,
+            'amount': amount
+        }
+        for item_name, quantity, unit, unit_price, amount
+        in zip(item_names, quantities, units, unit_prices, amounts)
+    ]
+
+
+# Vendor key (as used in VENDOR_CONFIG) -> parser for that vendor's PDFs
+_VENDOR_PARSERS = {
+    'hirayama': parse_hirayama_invoice,
+    'french_fnb': parse_french_fnb_invoice,
+}
 
 
 # Test function